@@ -8,6 +8,22 @@ import numexpr as ne
 import re
 import logging
 import requests
+import os
+import json
+import sys
+import argparse
+import hashlib
+import importlib.util
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from barrido import (
+    CRITERIOS_BARRIDO,
+    backtest_portafolio,
+    barrer_pesos,
+    generar_grilla_pesos,
+    muestrear_pesos,
+)
 
 # ------------------------------
 # Setup logging
@@ -124,6 +140,70 @@ def calcular_inflacion_diaria_rango(df, start_year, start_month, end_year, end_m
     return cumulative_inflation[1:]  # Remover el valor inicial de 1
 
 
+# ------------------------------
+# Función para armar la figura y calcular los rendimientos de la expresión y de la inflación
+def crear_figura(expression_str, df, cumulative_inflation, year=None):
+    initial_value = df['Result'].iloc[0]
+    # Ensure that the lengths match
+    min_length = min(len(cumulative_inflation), len(df))
+    inflation_line = initial_value * pd.Series(cumulative_inflation[:min_length], index=df.index[:min_length])
+
+    # Calcular rendimientos
+    expression_return = ((df['Result'].iloc[min_length - 1] - initial_value) / initial_value) * 100
+    inflation_return = ((cumulative_inflation[min_length - 1] - 1) * 100)
+
+    # Crear la figura
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=df['Date'].iloc[:min_length], y=df['Result'].iloc[:min_length],
+                             name="Activo", mode='lines'))
+    fig.add_trace(go.Scatter(x=df['Date'].iloc[:min_length], y=inflation_line,
+                             name='Inflación', line=dict(dash='dash', color='red'), mode='lines'))
+
+    title_text = f"{expression_str} vs Inflación ({year})" if year else f"{expression_str} vs Inflación (Rango de Fechas)"
+
+    # Add watermark
+    fig.add_annotation(
+        text="MTaurus - X: @MTaurus_ok",
+        xref="paper",
+        yref="paper",
+        x=0.5,
+        y=0.5,
+        showarrow=False,
+        font=dict(
+            size=30,
+            color="rgba(150,150,150,0.3)"
+        ),
+        textangle=-30,
+        opacity=0.3
+    )
+
+    fig.update_layout(
+        title=title_text,
+        xaxis_title='Fecha',
+        yaxis_title='Valor (ARS)',
+        height=600,
+        width=900,
+        dragmode='zoom',
+        hovermode='x unified',
+        xaxis=dict(
+            rangeslider=dict(visible=False),
+            showline=True,
+            showgrid=True
+        ),
+        yaxis=dict(
+            showline=True,
+            showgrid=True
+        ),
+        margin=dict(l=50, r=50, b=100, t=100),
+        paper_bgcolor="Black",
+    )
+
+    # Configurar el color de fondo de la figura
+    fig.update_layout(plot_bgcolor='black')
+
+    return fig, expression_return, inflation_return
+
+
 # ------------------------------
 # Función para generar y mostrar gráfico
 def generar_grafico(expression_str, df, cumulative_inflation, year=None, date_range=False):
@@ -132,63 +212,7 @@ def generar_grafico(expression_str, df, cumulative_inflation, year=None, date_ra
           st.warning("El DataFrame está vacío. No se puede generar el gráfico.")
           return
 
-      initial_value = df['Result'].iloc[0]
-      # Ensure that the lengths match
-      min_length = min(len(cumulative_inflation), len(df))
-      inflation_line = initial_value * pd.Series(cumulative_inflation[:min_length], index=df.index[:min_length])
-
-      # Calcular rendimientos
-      expression_return = ((df['Result'].iloc[min_length - 1] - initial_value) / initial_value) * 100
-      inflation_return = ((cumulative_inflation[min_length - 1] - 1) * 100)
-
-      # Crear la figura
-      fig = go.Figure()
-      fig.add_trace(go.Scatter(x=df['Date'].iloc[:min_length], y=df['Result'].iloc[:min_length],
-                               name="Activo", mode='lines'))
-      fig.add_trace(go.Scatter(x=df['Date'].iloc[:min_length], y=inflation_line,
-                               name='Inflación', line=dict(dash='dash', color='red'), mode='lines'))
-
-      title_text = f"{expression_str} vs Inflación ({year})" if year else f"{expression_str} vs Inflación (Rango de Fechas)"
-
-      # Add watermark
-      fig.add_annotation(
-          text="MTaurus - X: @MTaurus_ok",
-          xref="paper",
-          yref="paper",
-          x=0.5,
-          y=0.5,
-          showarrow=False,
-          font=dict(
-              size=30,
-              color="rgba(150,150,150,0.3)"
-          ),
-          textangle=-30,
-          opacity=0.3
-      )
-
-      fig.update_layout(
-          title=title_text,
-          xaxis_title='Fecha',
-          yaxis_title='Valor (ARS)',
-          height=600,
-          width=900,
-          dragmode='zoom',
-          hovermode='x unified',
-          xaxis=dict(
-              rangeslider=dict(visible=False),
-              showline=True,
-              showgrid=True
-          ),
-          yaxis=dict(
-              showline=True,
-              showgrid=True
-          ),
-          margin=dict(l=50, r=50, b=100, t=100),
-          paper_bgcolor="Black",
-      )
-
-      # Configurar el color de fondo de la figura
-      fig.update_layout(plot_bgcolor='black')
+      fig, expression_return, inflation_return = crear_figura(expression_str, df, cumulative_inflation, year)
 
       st.plotly_chart(fig)
       st.markdown(f"**Rendimiento de {expression_str}:** {expression_return:.2f}%")
@@ -269,22 +293,151 @@ def parse_portfolio(input_str):
     return portfolio
 
 
+# ------------------------------
+# Función para alinear las series descargadas en una única matriz de precios por fecha
+def alinear_precios(data_frames):
+    df_precios = data_frames[0]
+    for df in data_frames[1:]:
+        df_precios = pd.merge(df_precios, df, on='Date', how='outer')
+
+    # Ordenar por fecha y completar valores faltantes
+    df_precios = df_precios.sort_values('Date').reset_index(drop=True)
+    df_precios = df_precios.ffill().bfill()
+    return df_precios
+
+
+# ------------------------------
+# Opciones de rebalanceo para el backtest de portafolios
+REBALANCEOS = {
+    'Sin rebalanceo': None,
+    'Mensual': 'mensual',
+    'Trimestral': 'trimestral',
+    'Por desvío de pesos': 'umbral',
+}
+
+
+# ------------------------------
+# Función para evaluar un portafolio parseado sobre la matriz de precios alineada
+def evaluar_portafolio(portfolio, df_precios, rebalanceo=None, umbral=0.05):
+    columnas = [ticker.replace('.', '_') for ticker, _ in portfolio]
+    faltantes = [columna for columna in columnas if columna not in df_precios.columns]
+    if faltantes:
+        raise ValueError(f"Faltan datos para: {', '.join(faltantes)}")
+
+    precios = df_precios[columnas].to_numpy(dtype=float)
+    pesos = np.array([weight for _, weight in portfolio])
+    valores = backtest_portafolio(precios, pesos, rebalanceo, umbral, fechas=df_precios['Date'])
+    return valores[:, 0]
+
+
+# ------------------------------
+# Parámetros de validación de las series descargadas
+MAX_RUEDAS_SIN_DATOS = 5  # Huecos más largos que esto se informan
+SALTO_MINIMO_SPLIT = 1.45  # Variación diaria (factor) a partir de la cual se revisa un salto
+RATIOS_SPLIT = np.array([1.5, 2, 3, 4, 5, 6, 7, 8, 10])
+
+
+# ------------------------------
+# Función para validar una serie descargada antes de que entre al cache.
+# Ordena y elimina fechas duplicadas, y deja las marcas de calidad en df.attrs['calidad']
+# para que viajen con la entrada cacheada y no se recalculen.
+def validar_serie(df, ticker, max_ruedas_sin_datos=MAX_RUEDAS_SIN_DATOS):
+    calidad = {
+        'fechas_desordenadas': False,
+        'fechas_duplicadas': 0,
+        'huecos': [],
+        'posibles_splits': [],
+        'saltos_revertidos': [],
+    }
+    if df.empty:
+        df.attrs['calidad'] = calidad
+        return df
+
+    try:
+        # Fechas monótonas y únicas
+        calidad['fechas_desordenadas'] = not df['Date'].is_monotonic_increasing
+        calidad['fechas_duplicadas'] = int(df['Date'].duplicated().sum())
+        if calidad['fechas_desordenadas'] or calidad['fechas_duplicadas']:
+            df = df.sort_values('Date').drop_duplicates(subset=['Date'], keep='last').reset_index(drop=True)
+
+        fechas = df['Date'].to_numpy().astype('datetime64[D]')
+        dias = df['Date'].dt.strftime('%Y-%m-%d').to_numpy()
+
+        # Huecos: ruedas hábiles sin datos entre dos fechas consecutivas
+        ruedas_faltantes = np.busday_count(fechas[:-1], fechas[1:]) - 1
+        for i in np.flatnonzero(ruedas_faltantes > max_ruedas_sin_datos):
+            calidad['huecos'].append((dias[i], dias[i + 1], int(ruedas_faltantes[i])))
+
+        # Saltos diarios grandes: si se revierten al día siguiente son datos atípicos,
+        # si persisten y se parecen a un ratio de split probablemente falte el ajuste
+        precios = df[df.columns[1]].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_retornos = np.log(precios[1:] / precios[:-1])
+        saltos = np.abs(log_retornos) >= np.log(SALTO_MINIMO_SPLIT)
+        revertidos = saltos & (np.abs(log_retornos + np.append(log_retornos[1:], 0.0)) < np.log(1.1))
+        saltos &= ~np.insert(revertidos[:-1], 0, False)  # La vuelta de un dato atípico no es otro salto
+        distancia_split = np.abs(np.abs(log_retornos)[:, None] - np.log(RATIOS_SPLIT)).min(axis=1)
+        parecidos_split = distancia_split < np.log(1.05)
+
+        for i in np.flatnonzero(saltos & ~revertidos & parecidos_split):
+            calidad['posibles_splits'].append((dias[i + 1], round(float(precios[i] / precios[i + 1]), 2)))
+        for i in np.flatnonzero(saltos & revertidos):
+            calidad['saltos_revertidos'].append((dias[i + 1], round(float(np.exp(log_retornos[i]) - 1) * 100, 1)))
+    except Exception as e:
+        logger.error(f"Error validando datos para {ticker}: {e}")
+
+    for mensaje in describir_calidad(calidad):
+        logger.warning(f"{ticker}: {mensaje}")
+    df.attrs['calidad'] = calidad
+    return df
+
+
+# ------------------------------
+# Función para describir las marcas de calidad de una serie en texto
+def describir_calidad(calidad):
+    mensajes = []
+    if not calidad:
+        return mensajes
+    if calidad['fechas_desordenadas']:
+        mensajes.append("las fechas no venían ordenadas")
+    if calidad['fechas_duplicadas']:
+        mensajes.append(f"se eliminaron {calidad['fechas_duplicadas']} fechas duplicadas")
+    for desde, hasta, ruedas in calidad['huecos']:
+        mensajes.append(f"faltan {ruedas} ruedas entre {desde} y {hasta}")
+    for fecha, factor in calidad['posibles_splits']:
+        mensajes.append(f"posible split sin ajustar el {fecha} (precio dividido por {factor})")
+    for fecha, variacion in calidad['saltos_revertidos']:
+        mensajes.append(f"dato atípico el {fecha} ({variacion:+.1f}% revertido al día siguiente)")
+    return mensajes
+
+
+# ------------------------------
+# Función para mostrar en la UI las advertencias de calidad de una serie descargada
+def mostrar_calidad(ticker, calidad):
+    mensajes = describir_calidad(calidad)
+    if mensajes:
+        st.warning(f"Calidad de datos de {ticker}:\n" + "\n".join(f"- {mensaje}" for mensaje in mensajes))
+
+
 # ------------------------------
 # Caching functions to optimize performance
 @st.cache_data(ttl=86400)  # Cache data for one day
 def descargar_datos(ticker, start, end, source='YFinance'):
   if source == 'YFinance':
-      return descargar_datos_yfinance(ticker, start, end)
+      stock_data = descargar_datos_yfinance(ticker, start, end)
   elif source == 'AnálisisTécnico.com.ar':
-      return descargar_datos_analisistecnico(ticker, start, end)
+      stock_data = descargar_datos_analisistecnico(ticker, start, end)
   elif source == 'IOL (Invertir Online)':
-      return descargar_datos_iol(ticker, start, end)
+      stock_data = descargar_datos_iol(ticker, start, end)
   elif source == 'ByMA Data':
-      return descargar_datos_byma(ticker, start, end)
+      stock_data = descargar_datos_byma(ticker, start, end)
   else:
       logger.error(f"Unknown data source: {source}")
       return pd.DataFrame()
 
+  # Validate once per download; the quality flags are cached with the data
+  return validar_serie(stock_data, ticker)
+
 # Create a separate function for yfinance (original implementation)
 def descargar_datos_yfinance(ticker, start, end):
   try:
@@ -578,194 +731,655 @@ def obtener_evaluacion(expr_mapped, expression_mapped, df_expression):
 
 
 # ------------------------------
-# Streamlit UI
-st.title("Análisis de Expresiones con Tickers y Comparación con Inflación")
-
-# Add this near the top of the Streamlit UI section
-# Modify the sidebar radio button to include IOL
-st.sidebar.title("Configuración")
-data_source = st.sidebar.radio(
-  "Fuente de datos:",
-  ('YFinance', 'AnálisisTécnico.com.ar', 'IOL (Invertir Online)', 'ByMA Data')
-)
+# Almacén de resultados precalculados para los años ya cerrados (vista por año).
+# Cada entrada es un JSON con los rendimientos y la serie reducida, identificada por
+# expresión normalizada, fuente de datos, año y modo de evaluación. La clave incluye además
+# la inflación del año y la tabla de splits, así una corrección de esas tablas invalida las
+# entradas afectadas.
+DIRECTORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resultados_precalculados')
+PUNTOS_SERIE_PRECALCULADA = 120
+VERSION_RESULTADOS = 1  # Subir al cambiar ajustar_precios_por_splits o el formato de las entradas
 
-# Update the information section
-st.sidebar.markdown("""
-### Información sobre fuentes de datos:
-- **YFinance**: Datos internacionales, mejor para tickers extranjeros
-- **AnálisisTécnico.com.ar**: Datos locales, mejor para tickers argentinos
-- **IOL**: Datos locales con acceso a bonos y otros instrumentos
 
-*Nota: Algunos tickers pueden no estar disponibles en todas las fuentes.*
-""")
+def anio_cerrado(year):
+    return year < date.today().year
 
-st.markdown("""
-Esta aplicación permite analizar expresiones matemáticas complejas que involucran diferentes tickers bursátiles y compararlos con la inflación en Argentina.
 
-**Ejemplos de expresiones válidas (USAR SIEMPRE MAYÚSCULAS!!!!!):**
-- `VIST/(YPFD.BA/YPF)`
-- `GGAL.BA + TXAR.BA/ALUA.BA`
-- `AAPL.BA * 2 - GOOGL.BA / MSFT.BA`
-""")
+def normalizar_expresion(expression_str):
+    return re.sub(r'\s+', '', expression_str)
 
-# Input for expression
-expression_input = st.text_input(
-    "Ingrese la expresión con tickers (por ejemplo `VIST/(YPFD.BA/YPF)` o `GGAL.BA + TXAR.BA/ALUA.BA`):",
-    "GGAL.BA*1"
-)
 
-# Option to choose between per-year analysis or date range analysis
-analysis_type = st.radio(
-    "Seleccione el tipo de análisis:",
-    ('Por año (predeterminado)', 'Por rango de fechas')
-)
+def clave_resultado(expression_str, source, year, modo=('expresion',)):
+    contenido = json.dumps([
+        VERSION_RESULTADOS,
+        normalizar_expresion(expression_str),
+        source,
+        year,
+        list(modo),
+        inflation_rates.get(year),
+        splits,
+    ], sort_keys=True)
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+
+def resultado_valido(resultado):
+    try:
+        serie = resultado['serie']
+        return (
+            isinstance(resultado['calidad'], dict)
+            and isinstance(resultado['rendimiento'], (int, float))
+            and isinstance(resultado['inflacion'], (int, float))
+            and len(serie['Date']) > 0
+            and len(serie['Date']) == len(serie['Result']) == len(serie['Inflación'])
+        )
+    except (KeyError, TypeError):
+        return False
+
+
+def cargar_resultado(clave):
+    ruta = os.path.join(DIRECTORIO_RESULTADOS, f"{clave}.json")
+    if not os.path.exists(ruta):
+        return None
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            resultado = json.load(archivo)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error leyendo resultado precalculado {clave}: {e}")
+        return None
+    if not resultado_valido(resultado):
+        logger.error(f"Resultado precalculado {clave} con formato inválido, se recalcula.")
+        return None
+    return resultado
+
+
+def guardar_resultado(clave, resultado):
+    try:
+        os.makedirs(DIRECTORIO_RESULTADOS, exist_ok=True)
+        ruta = os.path.join(DIRECTORIO_RESULTADOS, f"{clave}.json")
+        # Escribir en un archivo temporal y reemplazar, para no dejar entradas a medio escribir
+        with open(ruta + '.tmp', 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, ensure_ascii=False)
+        os.replace(ruta + '.tmp', ruta)
+    except OSError as e:
+        logger.error(f"Error guardando resultado precalculado {clave}: {e}")
+
 
 # ------------------------------
-if analysis_type == 'Por año (predeterminado)':
-    # Analyze one graph per year (default)
-    for year in range(2017, 2025):
-        st.header(f"Análisis para el año {year}")
-        start_date = datetime(year, 1, 1)
-        end_date = datetime(year, 12, 31)
-
-        # Parse the expression and extract tickers
-        try:
-            expr_mapped, ticker_mapping = parse_expression(expression_input)
-            if not ticker_mapping:
-                st.warning("No se encontraron tickers en la expresión.")
-                continue
-        except ValueError as ve:
-            st.error(f"Error al parsear la expresión: {ve}")
-            break
+# Función para armar la entrada del almacén: rendimientos y serie reducida a pocos puntos.
+# Se conservan el primer y el último punto, así los rendimientos del gráfico no cambian.
+def construir_resultado(expression_str, source, year, df, cumulative_inflation, calidad):
+    n_puntos = min(len(cumulative_inflation), len(df))
+    indices = np.unique(np.linspace(0, n_puntos - 1, min(n_puntos, PUNTOS_SERIE_PRECALCULADA)).round().astype(int))
+    resultados = df['Result'].to_numpy(dtype=float)
+    inflacion = np.asarray(cumulative_inflation, dtype=float)
+
+    return {
+        'expresion': normalizar_expresion(expression_str),
+        'fuente': source,
+        'anio': year,
+        'rendimiento': (resultados[n_puntos - 1] / resultados[0] - 1) * 100,
+        'inflacion': (inflacion[n_puntos - 1] - 1) * 100,
+        'calidad': calidad,
+        'serie': {
+            'Date': df['Date'].iloc[indices].dt.strftime('%Y-%m-%d').tolist(),
+            'Result': resultados[indices].tolist(),
+            'Inflación': inflacion[indices].tolist(),
+        },
+    }
+
+
+def serie_de_resultado(resultado):
+    df = pd.DataFrame({
+        'Date': pd.to_datetime(resultado['serie']['Date']),
+        'Result': resultado['serie']['Result'],
+    })
+    return df, resultado['serie']['Inflación']
 
-        # Descargar datos para los tickers
-        data_frames = []
-        for original_ticker, var_name in ticker_mapping.items():
-            try:
-                stock_data = descargar_datos(original_ticker, start_date, end_date, source=data_source)
-                if not stock_data.empty:
-                    data_frames.append(stock_data)
-                else:
-                    st.warning(f"No se encontraron datos para {original_ticker} en el año {year}.")
-            except Exception as e:
-                st.error(f"Error descargando datos para {original_ticker}: {e}")
 
-        if data_frames:
-            try:
-                # Merge all data frames on 'Date'
-                df_expression = data_frames[0]
-                for df in data_frames[1:]:
-                    df_expression = pd.merge(df_expression, df, on='Date', how='outer')
+# ------------------------------
+# Función para exportar todo el almacén como un único JSON
+def exportar_resultados():
+    resultados = {}
+    if os.path.isdir(DIRECTORIO_RESULTADOS):
+        for nombre in sorted(os.listdir(DIRECTORIO_RESULTADOS)):
+            if nombre.endswith('.json'):
+                resultado = cargar_resultado(nombre[:-len('.json')])
+                if resultado is not None:
+                    resultados[nombre[:-len('.json')]] = resultado
+    return json.dumps(resultados, ensure_ascii=False).encode('utf-8')
 
-                # Sort by Date
-                df_expression.sort_values('Date', inplace=True)
-                # Fill missing values
-                df_expression.fillna(method='ffill', inplace=True)
-                df_expression.fillna(method='bfill', inplace=True)
 
-                # Evaluar la expresión
-                df_expression['Result'] = obtener_evaluacion(expr_mapped, expression_input, df_expression)
+# ------------------------------
+# Modo batch por línea de comandos (sin la UI web)
+FUENTES = ('YFinance', 'AnálisisTécnico.com.ar', 'IOL (Invertir Online)', 'ByMA Data')
 
-                # Calcular inflación acumulada
-                cumulative_inflation = obtener_inflacion(
-                    df_expression, start_date.year, start_date.month, end_date.year, end_date.month
-                )
 
-                # Verificar que el número de días coincida
-                if len(cumulative_inflation) != len(df_expression):
-                    st.warning(f"Desajuste en el cálculo de inflación para el año {year}.")
+def leer_expresiones(ruta):
+    # Una expresión por línea; se ignoran las líneas vacías y los comentarios con '#'
+    with open(ruta, encoding='utf-8') as archivo:
+        lineas = [linea.strip() for linea in archivo]
+    return list(dict.fromkeys(linea for linea in lineas if linea and not linea.startswith('#')))
 
-                # Agregar la columna de inflación (opcional)
-                df_expression['Inflación'] = cumulative_inflation if len(cumulative_inflation) == len(
-                    df_expression) else None
 
-                # Generar el gráfico
-                generar_grafico(expression_input, df_expression[['Date', 'Result']], cumulative_inflation, year)
+def tickers_de_expresion(expression_str, modo_portafolio=False):
+    if modo_portafolio:
+        return [ticker for ticker, _ in parse_portfolio(expression_str)]
+    _, ticker_mapping = parse_expression(expression_str)
+    # Los números sueltos (p. ej. el 1 de `GGAL.BA*1`) no son tickers
+    return [ticker for ticker in ticker_mapping if not re.fullmatch(r'[0-9.]+', ticker)]
 
-            except ZeroDivisionError as zde:
-                st.error(f"Error en la expresión para el año {year}: {zde}")
-                continue
-            except ValueError as ve:
-                st.error(f"Error en la expresión para el año {year}: {ve}")
-                continue
+
+# ------------------------------
+# Función para descargar en paralelo un conjunto de tickers (cada uno una sola vez)
+def descargar_tickers(tickers, start, end, source, hilos=8):
+    datos = {}
+    with ThreadPoolExecutor(max_workers=hilos) as executor:
+        futuros = {executor.submit(descargar_datos, ticker, start, end, source=source): ticker for ticker in tickers}
+        for futuro in as_completed(futuros):
+            ticker = futuros[futuro]
+            try:
+                datos[ticker] = futuro.result()
             except Exception as e:
-                st.error(f"Ocurrió un error inesperado para el año {year}: {e}")
-        else:
-            st.warning(f"No se pudieron obtener datos para los tickers en el año {year}.")
+                logger.error(f"Error descargando datos para {ticker}: {e}")
+                datos[ticker] = pd.DataFrame()
+    return datos
+
 
 # ------------------------------
-else:
-    # Date range analysis
-    st.header("Análisis por Rango de Fechas")
-    col1, col2 = st.columns(2)
-    with col1:
-        start_date = st.date_input("Fecha de inicio", date(2020, 1, 1))
-    with col2:
-        end_date = st.date_input("Fecha de fin", date(2024, 12, 31))
-
-    if start_date >= end_date:
-        st.error("La fecha de inicio debe ser anterior a la fecha de fin.")
+# Función para evaluar una expresión (o portafolio) y su inflación con datos ya descargados
+def procesar_expresion(expression_str, datos, start_date, end_date, modo_portafolio=False,
+                       rebalanceo=None, umbral=0.05):
+    tickers = tickers_de_expresion(expression_str, modo_portafolio)
+    faltantes = [ticker for ticker in tickers if datos.get(ticker, pd.DataFrame()).empty]
+    if faltantes:
+        raise ValueError(f"No se encontraron datos para: {', '.join(faltantes)}")
+
+    df_expression = alinear_precios([datos[ticker] for ticker in dict.fromkeys(tickers)])
+    if modo_portafolio:
+        df_expression['Result'] = evaluar_portafolio(parse_portfolio(expression_str), df_expression, rebalanceo, umbral)
+    else:
+        expr_mapped, _ = parse_expression(expression_str)
+        df_expression['Result'] = evaluate_expression_numexpr(expr_mapped, df_expression)
+
+    cumulative_inflation = calcular_inflacion_diaria_rango(
+        df_expression, start_date.year, start_date.month, end_date.year, end_date.month
+    )
+    if not cumulative_inflation:
+        raise ValueError("No hay datos de inflación para el rango de fechas.")
+    return df_expression, cumulative_inflation
+
+
+def guardar_fila_reporte(fila, ruta):
+    df_fila = pd.DataFrame([fila])
+    if ruta.endswith('.parquet'):
+        # Parquet no admite agregar filas: se reescribe el archivo completo
+        if os.path.exists(ruta):
+            df_fila = pd.concat([pd.read_parquet(ruta), df_fila], ignore_index=True)
+        df_fila.to_parquet(ruta, index=False)
+    else:
+        df_fila.to_csv(ruta, mode='a', header=not os.path.exists(ruta), index=False)
+
+
+def leer_reporte(ruta):
+    if not os.path.exists(ruta):
+        return pd.DataFrame()
+    return pd.read_parquet(ruta) if ruta.endswith('.parquet') else pd.read_csv(ruta, dtype=str)
+
+
+# Columnas que identifican una fila del reporte: la misma expresión con otro rango,
+# fuente o modo es otro resultado y no cuenta como completada al continuar
+COLUMNAS_CLAVE_REPORTE = ['Expresión', 'Desde', 'Hasta', 'Fuente', 'Modo']
+
+
+def filas_completadas(df_reporte):
+    if df_reporte.empty:
+        return set()
+    return set(df_reporte[COLUMNAS_CLAVE_REPORTE].astype(str).itertuples(index=False, name=None))
+
+
+def guardar_grafico(fig, directorio, indice, expression_str, formato):
+    os.makedirs(directorio, exist_ok=True)
+    nombre = f"{indice:03d}_{re.sub(r'[^A-Za-z0-9_.-]+', '_', expression_str)[:80]}"
+    if formato != 'html':
+        try:
+            ruta = os.path.join(directorio, f"{nombre}.{formato}")
+            fig.write_image(ruta)
+            return ruta
+        except (ImportError, ValueError, RuntimeError) as e:
+            # La exportación a imagen necesita kaleido (y Chrome en kaleido 1.x); sin él se guarda el HTML interactivo
+            logger.warning(f"No se pudo exportar {formato} ({e}); se guarda HTML.")
+    ruta = os.path.join(directorio, f"{nombre}.html")
+    fig.write_html(ruta)
+    return ruta
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compara una lista de expresiones con tickers contra la inflación en Argentina y escribe un reporte."
+    )
+    parser.add_argument('--expresiones', required=True, help="Archivo de texto con una expresión por línea.")
+    parser.add_argument('--desde', required=True, type=date.fromisoformat, help="Fecha de inicio (AAAA-MM-DD).")
+    parser.add_argument('--hasta', required=True, type=date.fromisoformat, help="Fecha de fin (AAAA-MM-DD).")
+    parser.add_argument('--fuente', choices=FUENTES, default='YFinance', help="Fuente de datos.")
+    parser.add_argument('--salida', required=True, help="Archivo de reporte (.csv o .parquet).")
+    parser.add_argument('--graficos', help="Directorio donde guardar un gráfico por expresión.")
+    parser.add_argument('--formato-graficos', choices=('png', 'svg', 'pdf', 'html'), default='png')
+    parser.add_argument('--portafolio', action='store_true',
+                        help="Interpretar las expresiones como portafolios ponderados (TICKER*peso + ...).")
+    parser.add_argument('--rebalanceo', choices=[valor for valor in REBALANCEOS.values() if valor])
+    parser.add_argument('--umbral', type=float, default=5.0, help="Desvío máximo de pesos (%%) para --rebalanceo umbral.")
+    parser.add_argument('--hilos', type=int, default=8, help="Descargas en paralelo.")
+    parser.add_argument('--reiniciar', action='store_true',
+                        help="Ignorar el reporte existente en lugar de continuar desde la última expresión completada.")
+    parser.add_argument('--sin-progreso', action='store_true', help="No mostrar el progreso.")
+    args = parser.parse_args(argv)
+
+    if args.desde >= args.hasta:
+        parser.error("La fecha de inicio debe ser anterior a la fecha de fin.")
+    # Dependencias opcionales del modo batch: pyarrow para .parquet y kaleido para gráficos estáticos
+    if args.salida.endswith('.parquet') and not (
+            importlib.util.find_spec('pyarrow') or importlib.util.find_spec('fastparquet')):
+        parser.error("Para escribir .parquet hace falta instalar pyarrow (o use un archivo .csv).")
+    if args.graficos and args.formato_graficos != 'html' and not importlib.util.find_spec('kaleido'):
+        logger.warning(f"kaleido no está instalado: los gráficos se guardan como HTML en lugar de {args.formato_graficos}.")
+        args.formato_graficos = 'html'
+
+    expresiones = leer_expresiones(args.expresiones)
+    if args.reiniciar and os.path.exists(args.salida):
+        os.remove(args.salida)
+    if not args.portafolio:
+        modo = 'expresion'
+    elif args.rebalanceo == 'umbral':
+        modo = f"portafolio/umbral {args.umbral:g}%"
     else:
-        # Parse the expression and extract tickers
+        modo = f"portafolio/{args.rebalanceo or 'sin rebalanceo'}"
+    parametros = (args.desde.isoformat(), args.hasta.isoformat(), args.fuente, modo)
+
+    df_reporte = leer_reporte(args.salida)
+    if not df_reporte.empty and not set(COLUMNAS_CLAVE_REPORTE) <= set(df_reporte.columns):
+        parser.error(f"{args.salida} no tiene el formato de reporte actual; use --reiniciar u otro archivo de salida.")
+    completadas = filas_completadas(df_reporte)
+    pendientes = [
+        (i, expresion) for i, expresion in enumerate(expresiones, 1) if (expresion, *parametros) not in completadas
+    ]
+    if len(pendientes) < len(expresiones):
+        logger.info(f"Se continúa el reporte: {len(expresiones) - len(pendientes)} expresiones ya completadas.")
+
+    # Tickers de todas las expresiones pendientes, descargados una sola vez y en paralelo
+    tickers = []
+    for _, expresion in pendientes:
         try:
-            expr_mapped, ticker_mapping = parse_expression(expression_input)
-            if not ticker_mapping:
-                st.warning("No se encontraron tickers en la expresión.")
+            tickers.extend(tickers_de_expresion(expresion, args.portafolio))
         except ValueError as ve:
-            st.error(f"Error al parsear la expresión: {ve}")
-            st.stop()
+            logger.error(f"Error al parsear la expresión {expresion}: {ve}")
+    datos = descargar_tickers(list(dict.fromkeys(tickers)), args.desde, args.hasta, args.fuente, args.hilos)
 
-        # Descargar datos para los tickers
-        data_frames = []
-        for original_ticker, var_name in ticker_mapping.items():
+    fallidas = []
+    for n, (indice, expresion) in enumerate(pendientes, 1):
+        if not args.sin_progreso:
+            print(f"[{n}/{len(pendientes)}] {expresion}", file=sys.stderr)
+        try:
+            df_expression, cumulative_inflation = procesar_expresion(
+                expresion, datos, args.desde, args.hasta, args.portafolio, args.rebalanceo, args.umbral / 100
+            )
+            fig, expression_return, inflation_return = crear_figura(
+                expresion, df_expression[['Date', 'Result']], cumulative_inflation
+            )
+            avisos = [
+                f"{ticker}: {mensaje}"
+                for ticker in dict.fromkeys(tickers_de_expresion(expresion, args.portafolio))
+                for mensaje in describir_calidad(datos[ticker].attrs.get('calidad'))
+            ]
+            fila = {
+                'Expresión': expresion,
+                'Fuente': args.fuente,
+                'Desde': args.desde.isoformat(),
+                'Hasta': args.hasta.isoformat(),
+                'Modo': modo,
+                'Primera rueda': df_expression['Date'].iloc[0].date().isoformat(),
+                'Última rueda': df_expression['Date'].iloc[min(len(cumulative_inflation), len(df_expression)) - 1].date().isoformat(),
+                'Rendimiento (%)': round(expression_return, 4),
+                'Inflación (%)': round(inflation_return, 4),
+                'Diferencia (%)': round(expression_return - inflation_return, 4),
+                'Rendimiento real (%)': round(((1 + expression_return / 100) / (1 + inflation_return / 100) - 1) * 100, 4),
+                'Avisos de calidad': '; '.join(avisos),
+            }
+            # Cada expresión se escribe apenas termina, así una falla posterior no pierde lo hecho
+            guardar_fila_reporte(fila, args.salida)
+        except Exception as e:
+            logger.error(f"Error procesando la expresión {expresion}: {e}")
+            fallidas.append(expresion)
+            continue
+
+        # El gráfico es un extra: si falla, la expresión igual queda completada en el reporte
+        if args.graficos:
             try:
-                stock_data = descargar_datos(original_ticker, start_date, end_date, source=data_source)
-                if not stock_data.empty:
-                    data_frames.append(stock_data)
-                else:
-                    st.warning(f"No se encontraron datos para {original_ticker} en el rango de fechas especificado.")
+                guardar_grafico(fig, args.graficos, indice, expresion, args.formato_graficos)
             except Exception as e:
-                st.error(f"Error descargando datos para {original_ticker}: {e}")
+                logger.error(f"Error guardando el gráfico de {expresion}: {e}")
 
-        if data_frames:
-            try:
-                # Merge all data frames on 'Date'
-                df_expression = data_frames[0]
-                for df in data_frames[1:]:
-                    df_expression = pd.merge(df_expression, df, on='Date', how='outer')
+    if fallidas:
+        logger.error(f"{len(fallidas)} expresiones fallaron y se reintentarán en la próxima ejecución: {', '.join(fallidas)}")
+        return 1
+    return 0
 
-                # Sort by Date
-                df_expression.sort_values('Date', inplace=True)
-                # Fill missing values
-                df_expression.fillna(method='ffill', inplace=True)
-                df_expression.fillna(method='bfill', inplace=True)
 
-                # Evaluar la expresión
-                df_expression['Result'] = obtener_evaluacion(expr_mapped, expression_input, df_expression)
+# Run the batch mode when executed directly with python (not through `streamlit run`).
+# The worker processes of the weight sweep re-import this script as __mp_main__,
+# so neither the batch mode nor the UI below may run on import.
+if __name__ == '__main__' and not st.runtime.exists():
+    sys.exit(main_cli())
 
-                # Calcular inflación acumulada
-                cumulative_inflation = obtener_inflacion(
-                    df_expression, start_date.year, start_date.month, end_date.year, end_date.month
-                )
 
-                # Verificar que el número de días coincida
-                if len(cumulative_inflation) != len(df_expression):
-                    st.warning("Desajuste en el cálculo de inflación para el rango de fechas seleccionado.")
+# ------------------------------
+# Streamlit UI
+if __name__ == '__main__':
+    st.title("Análisis de Expresiones con Tickers y Comparación con Inflación")
+
+    # Add this near the top of the Streamlit UI section
+    # Modify the sidebar radio button to include IOL
+    st.sidebar.title("Configuración")
+    data_source = st.sidebar.radio(
+      "Fuente de datos:",
+      FUENTES
+    )
+
+    # Update the information section
+    st.sidebar.markdown("""
+### Información sobre fuentes de datos:
+- **YFinance**: Datos internacionales, mejor para tickers extranjeros
+- **AnálisisTécnico.com.ar**: Datos locales, mejor para tickers argentinos
+- **IOL**: Datos locales con acceso a bonos y otros instrumentos
+
+*Nota: Algunos tickers pueden no estar disponibles en todas las fuentes.*
+""")
+
+    # Export of the precomputed per-year results, built only on demand
+    if st.sidebar.button("Exportar resultados precalculados"):
+        st.sidebar.download_button(
+            "Descargar resultados precalculados",
+            exportar_resultados(),
+            file_name="resultados_precalculados.json",
+            mime="application/json",
+        )
 
-                # Agregar la columna de inflación (opcional)
-                df_expression['Inflación'] = cumulative_inflation if len(cumulative_inflation) == len(
-                    df_expression) else None
+    st.markdown("""
+Esta aplicación permite analizar expresiones matemáticas complejas que involucran diferentes tickers bursátiles y compararlos con la inflación en Argentina.
 
-                # Generar el gráfico
-                generar_grafico(expression_input, df_expression[['Date', 'Result']], cumulative_inflation)
+**Ejemplos de expresiones válidas (USAR SIEMPRE MAYÚSCULAS!!!!!):**
+- `VIST/(YPFD.BA/YPF)`
+- `GGAL.BA + TXAR.BA/ALUA.BA`
+- `AAPL.BA * 2 - GOOGL.BA / MSFT.BA`
+""")
 
-            except ZeroDivisionError as zde:
-                st.error(f"Error en la expresión: {zde}")
-                st.stop()
+    # Input for expression
+    expression_input = st.text_input(
+        "Ingrese la expresión con tickers (por ejemplo `VIST/(YPFD.BA/YPF)` o `GGAL.BA + TXAR.BA/ALUA.BA`):",
+        "GGAL.BA*1"
+    )
+
+    # Option to choose between per-year analysis or date range analysis
+    analysis_type = st.radio(
+        "Seleccione el tipo de análisis:",
+        ('Por año (predeterminado)', 'Por rango de fechas', 'Optimización de pesos')
+    )
+
+    # Option to evaluate the expression as a weighted portfolio (TICKER*peso + ...) with rebalancing
+    # (the weight sweep always works on portfolios)
+    modo_barrido = analysis_type == 'Optimización de pesos'
+    modo_portafolio = modo_barrido or st.checkbox(
+        "Interpretar la expresión como portafolio ponderado (`TICKER*peso + ...`)"
+    )
+    rebalanceo = None
+    umbral_rebalanceo = 0.05
+    if modo_portafolio:
+        rebalanceo = REBALANCEOS[st.selectbox("Rebalanceo del portafolio:", tuple(REBALANCEOS))]
+        if rebalanceo == 'umbral':
+            umbral_rebalanceo = st.number_input(
+                "Desvío máximo de cada peso antes de rebalancear (%):", min_value=0.5, max_value=50.0, value=5.0
+            ) / 100
+
+    # ------------------------------
+    if analysis_type == 'Por año (predeterminado)':
+        # Analyze one graph per year (default)
+        for year in range(2017, 2025):
+            st.header(f"Análisis para el año {year}")
+            start_date = datetime(year, 1, 1)
+            end_date = datetime(year, 12, 31)
+
+            # Parse the expression and extract tickers
+            try:
+                if modo_portafolio:
+                    portfolio = parse_portfolio(expression_input)
+                    ticker_mapping = {ticker: ticker.replace('.', '_') for ticker, _ in portfolio}
+                else:
+                    expr_mapped, ticker_mapping = parse_expression(expression_input)
+                if not ticker_mapping:
+                    st.warning("No se encontraron tickers en la expresión.")
+                    continue
+            except ValueError as ve:
+                st.error(f"Error al parsear la expresión: {ve}")
+                break
+
+            # Closed years never change: use the precomputed result if there is one
+            modo = ('portafolio', rebalanceo, umbral_rebalanceo) if modo_portafolio else ('expresion',)
+            clave = clave_resultado(expression_input, data_source, year, modo)
+            resultado = cargar_resultado(clave) if anio_cerrado(year) else None
+            if resultado is not None:
+                for original_ticker, calidad in resultado['calidad'].items():
+                    mostrar_calidad(original_ticker, calidad)
+                df_serie, inflacion_serie = serie_de_resultado(resultado)
+                generar_grafico(expression_input, df_serie, inflacion_serie, year)
+                continue
+
+            # Descargar datos para los tickers
+            data_frames = []
+            calidad_por_ticker = {}
+            for original_ticker, var_name in ticker_mapping.items():
+                try:
+                    stock_data = descargar_datos(original_ticker, start_date, end_date, source=data_source)
+                    if not stock_data.empty:
+                        calidad_por_ticker[original_ticker] = stock_data.attrs.get('calidad')
+                        mostrar_calidad(original_ticker, stock_data.attrs.get('calidad'))
+                        data_frames.append(stock_data)
+                    else:
+                        st.warning(f"No se encontraron datos para {original_ticker} en el año {year}.")
+                except Exception as e:
+                    st.error(f"Error descargando datos para {original_ticker}: {e}")
+
+            if data_frames:
+                try:
+                    # Merge all data frames on 'Date', sort and fill missing values
+                    df_expression = alinear_precios(data_frames)
+
+                    # Evaluar la expresión (o simular el portafolio con rebalanceo)
+                    if modo_portafolio:
+                        df_expression['Result'] = evaluar_portafolio(
+                            portfolio, df_expression, rebalanceo, umbral_rebalanceo
+                        )
+                    else:
+                        df_expression['Result'] = obtener_evaluacion(expr_mapped, expression_input, df_expression)
+
+                    # Calcular inflación acumulada
+                    cumulative_inflation = obtener_inflacion(
+                        df_expression, start_date.year, start_date.month, end_date.year, end_date.month
+                    )
+
+                    # Verificar que el número de días coincida
+                    if len(cumulative_inflation) != len(df_expression):
+                        st.warning(f"Desajuste en el cálculo de inflación para el año {year}.")
+
+                    # Agregar la columna de inflación (opcional)
+                    df_expression['Inflación'] = cumulative_inflation if len(cumulative_inflation) == len(
+                        df_expression) else None
+
+                    # Generar el gráfico
+                    generar_grafico(expression_input, df_expression[['Date', 'Result']], cumulative_inflation, year)
+
+                    if anio_cerrado(year) and len(cumulative_inflation) == len(df_expression):
+                        guardar_resultado(clave, construir_resultado(
+                            expression_input, data_source, year, df_expression, cumulative_inflation, calidad_por_ticker
+                        ))
+
+                except ZeroDivisionError as zde:
+                    st.error(f"Error en la expresión para el año {year}: {zde}")
+                    continue
+                except ValueError as ve:
+                    st.error(f"Error en la expresión para el año {year}: {ve}")
+                    continue
+                except Exception as e:
+                    st.error(f"Ocurrió un error inesperado para el año {year}: {e}")
+            else:
+                st.warning(f"No se pudieron obtener datos para los tickers en el año {year}.")
+
+    # ------------------------------
+    elif analysis_type == 'Por rango de fechas':
+        # Date range analysis
+        st.header("Análisis por Rango de Fechas")
+        col1, col2 = st.columns(2)
+        with col1:
+            start_date = st.date_input("Fecha de inicio", date(2020, 1, 1))
+        with col2:
+            end_date = st.date_input("Fecha de fin", date(2024, 12, 31))
+
+        if start_date >= end_date:
+            st.error("La fecha de inicio debe ser anterior a la fecha de fin.")
+        else:
+            # Parse the expression and extract tickers
+            try:
+                if modo_portafolio:
+                    portfolio = parse_portfolio(expression_input)
+                    ticker_mapping = {ticker: ticker.replace('.', '_') for ticker, _ in portfolio}
+                else:
+                    expr_mapped, ticker_mapping = parse_expression(expression_input)
+                if not ticker_mapping:
+                    st.warning("No se encontraron tickers en la expresión.")
             except ValueError as ve:
-                st.error(f"Error en la expresión: {ve}")
+                st.error(f"Error al parsear la expresión: {ve}")
+                st.stop()
+
+            # Descargar datos para los tickers
+            data_frames = []
+            for original_ticker, var_name in ticker_mapping.items():
+                try:
+                    stock_data = descargar_datos(original_ticker, start_date, end_date, source=data_source)
+                    if not stock_data.empty:
+                        mostrar_calidad(original_ticker, stock_data.attrs.get('calidad'))
+                        data_frames.append(stock_data)
+                    else:
+                        st.warning(f"No se encontraron datos para {original_ticker} en el rango de fechas especificado.")
+                except Exception as e:
+                    st.error(f"Error descargando datos para {original_ticker}: {e}")
+
+            if data_frames:
+                try:
+                    # Merge all data frames on 'Date', sort and fill missing values
+                    df_expression = alinear_precios(data_frames)
+
+                    # Evaluar la expresión (o simular el portafolio con rebalanceo)
+                    if modo_portafolio:
+                        df_expression['Result'] = evaluar_portafolio(
+                            portfolio, df_expression, rebalanceo, umbral_rebalanceo
+                        )
+                    else:
+                        df_expression['Result'] = obtener_evaluacion(expr_mapped, expression_input, df_expression)
+
+                    # Calcular inflación acumulada
+                    cumulative_inflation = obtener_inflacion(
+                        df_expression, start_date.year, start_date.month, end_date.year, end_date.month
+                    )
+
+                    # Verificar que el número de días coincida
+                    if len(cumulative_inflation) != len(df_expression):
+                        st.warning("Desajuste en el cálculo de inflación para el rango de fechas seleccionado.")
+
+                    # Agregar la columna de inflación (opcional)
+                    df_expression['Inflación'] = cumulative_inflation if len(cumulative_inflation) == len(
+                        df_expression) else None
+
+                    # Generar el gráfico
+                    generar_grafico(expression_input, df_expression[['Date', 'Result']], cumulative_inflation)
+
+                except ZeroDivisionError as zde:
+                    st.error(f"Error en la expresión: {zde}")
+                    st.stop()
+                except ValueError as ve:
+                    st.error(f"Error en la expresión: {ve}")
+                    st.stop()
+                except Exception as e:
+                    st.error(f"Ocurrió un error inesperado: {e}")
+            else:
+                st.warning("No se pudieron obtener datos para los tickers en el rango de fechas especificado.")
+
+    # ------------------------------
+    else:
+        # Weight sweep over the tickers of the expression
+        st.header("Optimización de Pesos frente a la Inflación")
+        st.markdown("Se evalúan combinaciones de pesos para los tickers de la expresión (los pesos ingresados se ignoran).")
+        col1, col2 = st.columns(2)
+        with col1:
+            start_date = st.date_input("Fecha de inicio", date(2020, 1, 1))
+        with col2:
+            end_date = st.date_input("Fecha de fin", date(2024, 12, 31))
+
+        metodo_barrido = st.radio("Combinaciones a evaluar:", ('Grilla', 'Muestras aleatorias'))
+        if metodo_barrido == 'Grilla':
+            paso_grilla = st.select_slider("Paso de la grilla (%):", options=[5, 10, 20, 25, 50], value=10) / 100
+        else:
+            n_muestras = int(st.number_input("Cantidad de muestras:", min_value=100, max_value=200000, value=5000, step=100))
+        criterio_barrido = st.selectbox("Ordenar por:", tuple(CRITERIOS_BARRIDO))
+        top_barrido = int(st.number_input("Cantidad de resultados a mostrar:", min_value=5, max_value=100, value=20))
+
+        if start_date >= end_date:
+            st.error("La fecha de inicio debe ser anterior a la fecha de fin.")
+        elif st.button("Ejecutar barrido"):
+            tickers = list(dict.fromkeys(ticker for ticker, _ in parse_portfolio(expression_input)))
+            if len(tickers) < 2:
+                st.warning("Se necesitan al menos dos tickers para barrer pesos.")
+                st.stop()
+
+            # Descargar datos para los tickers
+            data_frames = []
+            for original_ticker in tickers:
+                try:
+                    stock_data = descargar_datos(original_ticker, start_date, end_date, source=data_source)
+                    if not stock_data.empty:
+                        mostrar_calidad(original_ticker, stock_data.attrs.get('calidad'))
+                        data_frames.append(stock_data)
+                    else:
+                        st.warning(f"No se encontraron datos para {original_ticker} en el rango de fechas especificado.")
+                except Exception as e:
+                    st.error(f"Error descargando datos para {original_ticker}: {e}")
+
+            columnas = [df.columns[1] for df in data_frames]
+            if len(columnas) < 2:
+                st.warning("No se pudieron obtener datos para al menos dos tickers en el rango de fechas especificado.")
                 st.stop()
+
+            try:
+                df_precios = alinear_precios(data_frames)
+                cumulative_inflation = obtener_inflacion(
+                    df_precios, start_date.year, start_date.month, end_date.year, end_date.month
+                )
+
+                if metodo_barrido == 'Grilla':
+                    n_pasos = int(round(1 / paso_grilla))
+                    if math.comb(n_pasos + len(columnas) - 1, len(columnas) - 1) > 200000:
+                        st.error("La grilla tiene demasiadas combinaciones. Aumente el paso o use muestras aleatorias.")
+                        st.stop()
+                    pesos = generar_grilla_pesos(len(columnas), paso_grilla)
+                else:
+                    pesos = muestrear_pesos(len(columnas), n_muestras)
+
+                progreso = st.progress(0.0)
+                tabla_mejores = st.empty()
+                for evaluadas, mejores in barrer_pesos(
+                    df_precios[columnas].to_numpy(dtype=float), df_precios['Date'], cumulative_inflation, pesos,
+                    columnas, criterio_barrido, rebalanceo, umbral_rebalanceo, top=top_barrido
+                ):
+                    progreso.progress(evaluadas / len(pesos), text=f"{evaluadas} de {len(pesos)} combinaciones evaluadas")
+                    tabla_mejores.dataframe(mejores.round(2))
+            except ValueError as ve:
+                st.error(f"Error en el barrido de pesos: {ve}")
             except Exception as e:
                 st.error(f"Ocurrió un error inesperado: {e}")
-        else:
-            st.warning("No se pudieron obtener datos para los tickers en el rango de fechas especificado.")
@@ -0,0 +1,252 @@
+import itertools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# ------------------------------
+# Backtest de portafolios con rebalanceo y barrido de pesos frente a la inflación.
+# Vive en un módulo importable para que los procesos del barrido puedan cargar al trabajador.
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------
+# Función para obtener las posiciones de las ruedas en las que se rebalancea (primera rueda de cada período)
+def calcular_fechas_rebalanceo(fechas, frecuencia):
+    fechas = pd.DatetimeIndex(fechas)
+    if frecuencia == 'mensual':
+        periodos = np.asarray(fechas.year * 12 + fechas.month)
+    elif frecuencia == 'trimestral':
+        periodos = np.asarray(fechas.year * 4 + (fechas.month - 1) // 3)
+    else:
+        return np.array([0])
+
+    cambios = np.flatnonzero(np.diff(periodos)) + 1
+    return np.concatenate(([0], cambios))
+
+
+# ------------------------------
+# Backtest con rebalanceo cuando algún peso se desvía más que el umbral del objetivo.
+# Avanza todas las combinaciones a la vez mirando una ventana de ruedas hacia adelante desde
+# el último rebalanceo de cada una; la ventana se duplica mientras ninguna combinación se desvíe.
+VENTANA_UMBRAL_INICIAL = 8
+VENTANA_UMBRAL_MAXIMA = 512
+
+
+def _backtest_por_umbral(precios, pesos, umbral, capital_inicial):
+    n_dias = precios.shape[0]
+    valores = np.empty((n_dias, pesos.shape[0]))
+    valores[0] = capital_inicial
+
+    nominales = capital_inicial * pesos / precios[0]
+    posicion = np.zeros(pesos.shape[0], dtype=int)  # Última rueda ya valuada de cada combinación
+    activas = np.arange(pesos.shape[0]) if n_dias > 1 else np.arange(0)
+    ventana = VENTANA_UMBRAL_INICIAL
+
+    while activas.size:
+        pasos = np.arange(1, ventana + 1)
+        dias = np.minimum(posicion[activas, None] + pasos, n_dias - 1)  # (combinaciones, ventana)
+        tenencias = precios[dias] * nominales[activas, None, :]
+        valor = tenencias.sum(axis=2)
+
+        # Primera rueda de la ventana en la que algún peso se aleja del objetivo más que el umbral
+        desvio = np.abs(tenencias / valor[..., None] - pesos[activas, None, :]).max(axis=2)
+        excedido = desvio > umbral
+        rebalancea = excedido.any(axis=1)
+        avance = np.where(rebalancea, excedido.argmax(axis=1) + 1, ventana)
+        avance = np.minimum(avance, n_dias - 1 - posicion[activas])
+
+        validos = pasos <= avance[:, None]
+        valores[dias[validos], np.repeat(activas, avance)] = valor[validos]
+
+        # Rebalancear a los pesos objetivo con el valor de la rueda en que se excedió el umbral
+        filas = np.flatnonzero(rebalancea)
+        dias_rebalanceo = dias[filas, avance[filas] - 1]
+        capital = valor[filas, avance[filas] - 1]
+        nominales[activas[filas]] = capital[:, None] * pesos[activas[filas]] / precios[dias_rebalanceo]
+
+        posicion[activas] += avance
+        activas = activas[posicion[activas] < n_dias - 1]
+        ventana = VENTANA_UMBRAL_INICIAL if rebalancea.any() else min(ventana * 2, VENTANA_UMBRAL_MAXIMA)
+
+    return valores
+
+
+# ------------------------------
+# Función para simular el valor de un portafolio con rebalanceo.
+# precios: matriz (días, activos); pesos: vector (activos,) o matriz (combinaciones, activos).
+# Los pesos se normalizan para sumar 1 y representan la fracción del capital en cada activo.
+# Devuelve una matriz (días, combinaciones) con el valor del portafolio.
+def backtest_portafolio(precios, pesos, rebalanceo=None, umbral=0.05, fechas=None, capital_inicial=100.0):
+    precios = np.asarray(precios, dtype=float)
+    pesos = np.atleast_2d(np.asarray(pesos, dtype=float))
+
+    if not np.all(np.isfinite(precios)) or np.any(precios <= 0):
+        raise ValueError("La matriz de precios contiene valores faltantes o no positivos.")
+    suma_pesos = pesos.sum(axis=1, keepdims=True)
+    if np.any(suma_pesos <= 0):
+        raise ValueError("Los pesos del portafolio deben sumar un valor positivo.")
+    pesos = pesos / suma_pesos
+
+    n_dias = precios.shape[0]
+    valores = np.empty((n_dias, pesos.shape[0]))
+
+    if rebalanceo == 'umbral':
+        # Por bloques de combinaciones, para acotar la memoria de las ventanas
+        for k in range(0, pesos.shape[0], 1000):
+            valores[:, k:k + 1000] = _backtest_por_umbral(precios, pesos[k:k + 1000], umbral, capital_inicial)
+        return valores
+
+    if rebalanceo is not None and fechas is None:
+        raise ValueError("Se necesitan las fechas para rebalancear por calendario.")
+    inicios = calcular_fechas_rebalanceo(fechas, rebalanceo) if rebalanceo else np.array([0])
+    limites = np.append(inicios, n_dias)
+
+    capital = np.full(pesos.shape[0], capital_inicial)
+    for inicio, fin in zip(limites[:-1], limites[1:]):
+        # Nominales (combinaciones, activos) constantes hasta el próximo rebalanceo
+        nominales = capital[:, None] * pesos / precios[inicio]
+        valores[inicio:fin] = precios[inicio:fin] @ nominales.T
+        if fin < n_dias:
+            capital = nominales @ precios[fin]
+
+    return valores
+
+
+
+
+# ------------------------------
+# Criterios para ordenar el barrido de pesos: columna y si se ordena de menor a mayor
+CRITERIOS_BARRIDO = {
+    'Rendimiento real': ('Rendimiento real (%)', False),
+    'Volatilidad': ('Volatilidad anual (%)', True),
+    'Máxima caída': ('Máxima caída real (%)', True),
+}
+
+
+# ------------------------------
+# Función para generar todas las combinaciones de pesos múltiplos de `paso` que suman 1
+def generar_grilla_pesos(n_activos, paso=0.1):
+    n_pasos = int(round(1 / paso))
+    # Stars and bars: cada combinación de separadores define un reparto de los pasos entre los activos
+    separadores = np.array(list(itertools.combinations(range(n_pasos + n_activos - 1), n_activos - 1)), dtype=int)
+    separadores = separadores.reshape(-1, n_activos - 1)
+    bordes = np.hstack([
+        np.full((len(separadores), 1), -1),
+        separadores,
+        np.full((len(separadores), 1), n_pasos + n_activos - 1),
+    ])
+    return (np.diff(bordes, axis=1) - 1) / n_pasos
+
+
+# ------------------------------
+# Función para muestrear pesos al azar (distribución uniforme sobre el simplex)
+def muestrear_pesos(n_activos, n_muestras, semilla=None):
+    rng = np.random.default_rng(semilla)
+    return rng.dirichlet(np.ones(n_activos), n_muestras)
+
+
+# ------------------------------
+# Función para calcular métricas de cada combinación frente a la inflación.
+# valores: matriz (días, combinaciones); inflacion: inflación acumulada diaria alineada a los días.
+def calcular_metricas_barrido(valores, inflacion):
+    inflacion = np.asarray(inflacion, dtype=float)[:, None]
+    valores_reales = valores / (valores[0] * inflacion)
+
+    rendimiento_real = (valores_reales[-1] - 1) * 100
+    retornos = np.diff(np.log(valores), axis=0)
+    volatilidad = retornos.std(axis=0) * np.sqrt(252) * 100 if len(retornos) > 1 else np.zeros(valores.shape[1])
+    maxima_caida = (1 - valores_reales / np.maximum.accumulate(valores_reales, axis=0)).max(axis=0) * 100
+
+    return {
+        'Rendimiento real (%)': rendimiento_real,
+        'Volatilidad anual (%)': volatilidad,
+        'Máxima caída real (%)': maxima_caida,
+    }
+
+
+# ------------------------------
+# Estado de solo lectura de cada proceso del barrido. La matriz de precios se comparte
+# por memoria compartida: cada proceso la mapea una vez, sin copiarla.
+_DATOS_BARRIDO = {}
+
+
+def _inicializar_barrido(nombre_memoria, forma, fechas, inflacion, rebalanceo, umbral):
+    memoria = shared_memory.SharedMemory(name=nombre_memoria)
+    precios = np.ndarray(forma, dtype=np.float64, buffer=memoria.buf)
+    precios.flags.writeable = False
+    _DATOS_BARRIDO.update(
+        memoria=memoria, precios=precios, fechas=fechas, inflacion=inflacion, rebalanceo=rebalanceo, umbral=umbral
+    )
+
+
+def _evaluar_lote_barrido(pesos, datos=None):
+    datos = datos or _DATOS_BARRIDO
+    valores = backtest_portafolio(
+        datos['precios'], pesos, datos['rebalanceo'], datos['umbral'], fechas=datos['fechas']
+    )
+    return calcular_metricas_barrido(valores, datos['inflacion'])
+
+
+# ------------------------------
+# Función para barrer combinaciones de pesos en paralelo.
+# Es un generador: después de cada lote terminado devuelve (evaluadas, DataFrame con las mejores `top`).
+# Los procesos se crean con spawn (no fork, que no es seguro desde el servidor de Streamlit con hilos);
+# si el pool falla por cualquier motivo, los lotes pendientes se evalúan en este proceso.
+def barrer_pesos(precios, fechas, inflacion, pesos, columnas, criterio='Rendimiento real',
+                 rebalanceo=None, umbral=0.05, top=20, tam_lote=500, procesos=None):
+    columna_orden, ascendente = CRITERIOS_BARRIDO[criterio]
+    precios = np.asarray(precios, dtype=float)
+    n_dias = min(len(precios), len(inflacion))
+    precios = np.ascontiguousarray(precios[:n_dias])
+    fechas = pd.DatetimeIndex(fechas)[:n_dias].to_numpy()
+    inflacion = np.asarray(inflacion[:n_dias], dtype=float)
+
+    lotes = [pesos[i:i + tam_lote] for i in range(0, len(pesos), tam_lote)]
+    procesos = min(procesos or os.cpu_count() or 1, len(lotes))
+
+    mejores = pd.DataFrame()
+    evaluadas = 0
+
+    def incorporar(lote, metricas):
+        nonlocal mejores, evaluadas
+        df_lote = pd.DataFrame(lote * 100, columns=[f"{columna} (%)" for columna in columnas])
+        df_lote = df_lote.assign(**metricas)
+        mejores = pd.concat([mejores, df_lote], ignore_index=True)
+        mejores = mejores.sort_values(columna_orden, ascending=ascendente).head(top).reset_index(drop=True)
+        evaluadas += len(lote)
+        return evaluadas, mejores
+
+    pendientes = dict(enumerate(lotes))
+
+    if procesos > 1:
+        memoria = None
+        try:
+            memoria = shared_memory.SharedMemory(create=True, size=max(precios.nbytes, 1))
+            np.ndarray(precios.shape, dtype=np.float64, buffer=memoria.buf)[:] = precios
+            with ProcessPoolExecutor(
+                max_workers=procesos,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_inicializar_barrido,
+                initargs=(memoria.name, precios.shape, fechas, inflacion, rebalanceo, umbral),
+            ) as executor:
+                futuros = {executor.submit(_evaluar_lote_barrido, lote): i for i, lote in pendientes.items()}
+                for futuro in as_completed(futuros):
+                    metricas = futuro.result()
+                    yield incorporar(pendientes.pop(futuros[futuro]), metricas)
+        except Exception as e:
+            # Errores del pool o de serialización; un error real del cálculo se repite abajo
+            logger.error(f"Error en el pool de procesos del barrido, se continúa en un solo proceso: {e}")
+        finally:
+            if memoria is not None:
+                memoria.close()
+                memoria.unlink()
+
+    datos = dict(precios=precios, fechas=fechas, inflacion=inflacion, rebalanceo=rebalanceo, umbral=umbral)
+    for i in list(pendientes):
+        lote = pendientes.pop(i)
+        yield incorporar(lote, _evaluar_lote_barrido(lote, datos))